@@ -0,0 +1,157 @@
+import json
+import logging
+import tarfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import yaml
+
+logger = logging.getLogger(__name__)
+
+
+def _model(document: dict, member_name: str):
+    meta = document.get("serdes/meta")
+    if meta:
+        return meta[-1].get("model")
+    # Fall back to the directory layout of the serialized collections
+    if "/cards/" in member_name:
+        return "Card"
+    if "/dashboards/" in member_name:
+        return "Dashboard"
+    return None
+
+
+def _source_table(card: dict):
+    query = (card.get("dataset_query") or {}).get("query") or {}
+    table = query.get("source-table")
+    if isinstance(table, list):
+        return ".".join(str(part) for part in table if part is not None)
+    return table
+
+
+def find_segment_references(node) -> list:
+    segments = []
+    if isinstance(node, dict):
+        for value in node.values():
+            segments.extend(find_segment_references(value))
+    elif isinstance(node, list):
+        if len(node) >= 2 and node[0] == "segment":
+            segment = node[1]
+            if isinstance(segment, list):
+                segment = ".".join(str(part) for part in segment)
+            segments.append(segment)
+        else:
+            for value in node:
+                segments.extend(find_segment_references(value))
+    return segments
+
+
+def analyze_export_tarball(tarball_path: str):
+    counts = {"cards": 0, "dashboards": 0, "filters": 0, "segment_filters": 0}
+    segment_references = []
+
+    with tarfile.open(tarball_path, "r:gz") as tar:
+        for member in tar:
+            if not member.isfile() or not member.name.endswith(
+                (".yaml", ".yml")
+            ):
+                continue
+            content = tar.extractfile(member).read().decode("utf-8")
+            # Same fix as remove_all_segments_in_files, "=" is not valid YAML
+            content = content.replace("- =", '- "="')
+            try:
+                document = yaml.safe_load(content)
+            except yaml.YAMLError as e:
+                logger.warning(f"Could not parse {member.name}: {e}")
+                continue
+            if not isinstance(document, dict):
+                continue
+
+            model = _model(document, member.name)
+            if model == "Dashboard":
+                counts["dashboards"] += 1
+                counts["filters"] += len(document.get("parameters") or [])
+            elif model == "Card":
+                counts["cards"] += 1
+                segments = find_segment_references(
+                    document.get("dataset_query")
+                )
+                counts["segment_filters"] += len(segments)
+                card = document.get("entity_id") or member.name
+                table = _source_table(document)
+                for segment in segments:
+                    segment_references.append(
+                        {
+                            "segment": segment,
+                            "table": table,
+                            "card": card,
+                            "card_name": document.get("name"),
+                        }
+                    )
+
+    return Path(tarball_path).name.split(".")[0], counts, segment_references
+
+
+def _add_card(entry: dict, reference: dict, app_id: str):
+    card = entry["cards"].setdefault(
+        reference["card"], {"name": reference["card_name"], "apps": []}
+    )
+    if app_id not in card["apps"]:
+        card["apps"].append(app_id)
+
+
+def analyze_exports(export_directory: str, workers: int = None) -> dict:
+    tarballs = sorted(
+        str(path) for path in Path(export_directory).glob("*.tar.gz")
+    )
+
+    analysis = {"apps": {}, "segments": {}, "tables": {}, "failed": {}}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(analyze_export_tarball, tarball): tarball
+            for tarball in tarballs
+        }
+        for future, tarball in futures.items():
+            try:
+                app_id, counts, segment_references = future.result()
+            except Exception as e:
+                logger.exception(e)
+                analysis["failed"][tarball] = str(e)
+                continue
+
+            analysis["apps"][app_id] = counts
+            for reference in segment_references:
+                segment = str(reference["segment"])
+                table = reference["table"]
+
+                entry = analysis["segments"].setdefault(
+                    segment, {"tables": [], "cards": {}}
+                )
+                if table is not None and table not in entry["tables"]:
+                    entry["tables"].append(table)
+                _add_card(entry, reference, app_id)
+
+                # Native query cards have no source table to index
+                if table is None:
+                    continue
+                entry = analysis["tables"].setdefault(
+                    str(table), {"segments": [], "cards": {}}
+                )
+                if segment not in entry["segments"]:
+                    entry["segments"].append(segment)
+                _add_card(entry, reference, app_id)
+
+    return analysis
+
+
+def get_apps_with_segment_filters(analysis: dict) -> list:
+    return sorted(
+        app_id
+        for app_id, counts in analysis["apps"].items()
+        if counts["segment_filters"]
+    )
+
+
+def save_analysis(analysis: dict, environment: str = "testing"):
+    with open(f"export-analysis-{environment}.json", "w") as file:
+        json.dump(analysis, file)
@@ -1,4 +1,5 @@
 import json
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 import requests
 
@@ -135,3 +136,135 @@ class CloudAdminClient:
         response = requests.put(url=url, headers=headers, json=data)
         response.raise_for_status()
         return response
+
+    def get_docker_swarm_objects(
+        self, identifiers: list, fields: list, batch_size: int = 100
+    ) -> dict:
+        url = f"{self.domain}/api/v1/query/"
+        headers = {
+            "x-api-key": self.api_key,
+            "accept": "application/hal+json",
+        }
+        response_format = {"_id": None, "identifier": None}
+        response_format.update({field: None for field in fields})
+
+        objects = {}
+        for start in range(0, len(identifiers), batch_size):
+            end = start + batch_size
+            batch = identifiers[start:end]
+            query = {
+                "limetype": "docker_swarm",
+                "responseFormat": {"object": response_format},
+                "filter": {
+                    "key": "identifier",
+                    "op": "IN",
+                    "exp": batch,
+                },
+                "limit": 0,  # noqa
+            }
+            params = "q=" + json.dumps(query)
+            response = requests.get(url=url, headers=headers, params=params)
+            response.raise_for_status()
+            result = json.loads(response.text)
+            for found in result["objects"]:
+                objects[found["identifier"]] = found
+
+        return objects
+
+    def sync_docker_swarm_objects(
+        self,
+        desired: dict,
+        batch_size: int = 100,
+        max_workers: int = 8,
+        create_missing: bool = True,
+        dry_run: bool = False,
+    ) -> dict:
+        fields = sorted({field for data in desired.values() for field in data})
+        current = self.get_docker_swarm_objects(
+            list(desired), fields, batch_size
+        )
+
+        summary = {
+            "created": [],
+            "updated": {},
+            "unchanged": [],
+            "missing": [],
+            "failed": {},
+        }
+        changes = {}
+        for identifier, data in desired.items():
+            if identifier not in current:
+                if create_missing:
+                    payload = {"identifier": identifier}
+                    payload.update(
+                        {
+                            field: _serialize_field(value)
+                            for field, value in data.items()
+                        }
+                    )
+                    changes[identifier] = (None, payload)
+                else:
+                    summary["missing"].append(identifier)
+                continue
+
+            payload = {
+                field: _serialize_field(value)
+                for field, value in data.items()
+                if _field_changed(current[identifier].get(field), value)
+            }
+            if payload:
+                changes[identifier] = (current[identifier]["_id"], payload)
+            else:
+                summary["unchanged"].append(identifier)
+
+        if dry_run:
+            for identifier, (object_id, payload) in changes.items():
+                if object_id is None:
+                    summary["created"].append(identifier)
+                else:
+                    summary["updated"][identifier] = sorted(payload)
+            return summary
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {}
+            for identifier, (object_id, payload) in changes.items():
+                if object_id is None:
+                    future = executor.submit(
+                        self.create_docker_swarm_object, payload
+                    )
+                else:
+                    future = executor.submit(
+                        self.update_docker_swarm_object, object_id, payload
+                    )
+                futures[future] = identifier
+
+            for future in as_completed(futures):
+                identifier = futures[future]
+                object_id, payload = changes[identifier]
+                try:
+                    future.result()
+                except Exception as e:
+                    summary["failed"][identifier] = str(e)
+                    continue
+                if object_id is None:
+                    summary["created"].append(identifier)
+                else:
+                    summary["updated"][identifier] = sorted(payload)
+
+        return summary
+
+
+def _serialize_field(value):
+    # Structured fields such as lime_bi_config are stored as JSON text
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return value
+
+
+def _field_changed(current, desired) -> bool:
+    if isinstance(desired, (dict, list)) and isinstance(current, str):
+        try:
+            current = json.loads(current)
+        except ValueError:
+            return True
+    return current != desired
@@ -10,7 +10,10 @@ from limepkg_metabase.serialization.file_operations import (
     extract_tarball,
 )
 
+import analysis
 import util
+from registry import ApplicationRegistry
+from storage import S3ExportSink
 
 load_dotenv(override=True)
 
@@ -53,6 +56,8 @@ METABASE_LIME_CLOUD_DEV_METABASE_URL = os.getenv(
     "METABASE_LIME_CLOUD_DEV_METABASE_URL"
 )
 
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL")
+
 TEST_IMPORT_APP_ID = os.getenv("TEST_IMPORT_APP_ID")
 TEST_IMPORT_APP_USERNAME = os.getenv("TEST_IMPORT_APP_USERNAME")
 TEST_IMPORT_APP_PASSWORD = os.getenv("TEST_IMPORT_APP_PASSWORD")
@@ -118,12 +123,170 @@ def load_applications(environment):
     required=True,
     help="The environment to use (production or testing)",
 )
-def test_export(environment):
-    util.test_export_for_apps(LIME_BI_CREDENTIALS, environment)
+@click.option(
+    "--workers",
+    "-w",
+    type=click.IntRange(min=1),
+    default=1,
+    help="Number of exports to run in parallel",
+)
+@click.option(
+    "--s3-bucket",
+    default=None,
+    help="Also upload every export to this S3 bucket",
+)
+@click.option(
+    "--retry-failed",
+    is_flag=True,
+    help="Export the apps where the last export failed again",
+)
+def test_export(environment, workers, s3_bucket, retry_failed):
+    sink = None
+    if s3_bucket:
+        sink = S3ExportSink(
+            s3_bucket,
+            prefix=f"{environment}/",
+            manifest_path=f"s3-manifest-{environment}.json",
+            endpoint_url=S3_ENDPOINT_URL,
+        )
+    util.test_export_for_apps(
+        LIME_BI_CREDENTIALS, environment, workers, sink, retry_failed
+    )
+
+
+@click.command()
+@click.option(
+    "--environment",
+    "-e",
+    type=click.Choice(["production", "testing"]),
+    required=True,
+    help="The environment to use (production or testing)",
+)
+@click.option(
+    "--dry-run",
+    is_flag=True,
+    help="Only print what would be changed in Cloud Admin",
+)
+def sync_lime_bi_config(environment, dry_run):
+    summary = util.sync_lime_bi_configs(environment, dry_run)
+
+    print(f"Created: {len(summary['created'])}")
+    print(f"Updated: {len(summary['updated'])}")
+    for identifier, fields in summary["updated"].items():
+        print(f"  {identifier}: {', '.join(fields)}")
+    print(f"Unchanged: {len(summary['unchanged'])}")
+    print(f"Missing in Cloud Admin: {len(summary['missing'])}")
+    print(f"Failed: {len(summary['failed'])}")
+    for identifier, error in summary["failed"].items():
+        print(f"  {identifier}: {error}")
+
+
+@click.command()
+@click.option(
+    "--environment",
+    "-e",
+    type=click.Choice(["production", "testing"]),
+    required=True,
+    help="The environment to use (production or testing)",
+)
+@click.option(
+    "--workers",
+    "-w",
+    type=click.IntRange(min=1),
+    default=None,
+    help="Number of processes to use, defaults to the number of CPUs",
+)
+def analyze_exports(environment, workers):
+    export_directory = f"{util.EXPORT_DIRECTORY}/{environment}"
+    result = analysis.analyze_exports(export_directory, workers)
+    analysis.save_analysis(result, environment)
+
+    apps = result["apps"]
+    print(f"Analyzed {len(apps)} exports")
+    print(f"Cards: {sum(counts['cards'] for counts in apps.values())}")
+    print(
+        f"Dashboards: {sum(counts['dashboards'] for counts in apps.values())}"
+    )
+    print(f"Filters: {sum(counts['filters'] for counts in apps.values())}")
+    print(f"Segments in use: {len(result['segments'])}")
+
+    segment_apps = analysis.get_apps_with_segment_filters(result)
+    print(f"Apps with segment filters: {len(segment_apps)}")
+    for app_id in segment_apps:
+        print(f"  {app_id}: {apps[app_id]['segment_filters']}")
+    for tarball, error in result["failed"].items():
+        print(f"Failed to analyze {tarball}: {error}")
 
 
 @click.command()
-def import_collection():
+@click.option(
+    "--environment",
+    "-e",
+    type=click.Choice(["production", "testing"]),
+    required=True,
+    help="The environment to use (production or testing)",
+)
+@click.option(
+    "--status",
+    type=click.Choice(["succeeded", "failed", "pending"]),
+    default=None,
+    help="Only list apps with this export status",
+)
+@click.option(
+    "--database-id",
+    type=int,
+    default=None,
+    help="Only list apps using this Lime BI database",
+)
+@click.option(
+    "--metabase-host",
+    default=None,
+    help="Only list apps on this Metabase host",
+)
+@click.option(
+    "--missing-config",
+    is_flag=True,
+    help="Only list apps without a Lime BI config",
+)
+def list_apps(environment, status, database_id, metabase_host, missing_config):
+    registry = ApplicationRegistry.load(
+        environment, LIME_BI_CREDENTIALS[environment]["metabase_url"]
+    )
+    records = registry.query(
+        status=status,
+        database_id=database_id,
+        metabase_host=metabase_host,
+        missing_lime_bi_config=missing_config or None,
+    )
+    for record in records:
+        print(
+            f"{record.app_id} {record.export_status}"
+            f" database_id={record.database_id}"
+            f" host={record.metabase_host}"
+        )
+    print(f"{len(records)} of {len(registry.records)} apps")
+
+
+def get_tarball_path(app_id, environment):
+    if app_id:
+        return util.get_export_tarball_path(app_id, environment)
+    return util.COLLECTION_FILE_NAME
+
+
+@click.command()
+@click.option(
+    "--app-id",
+    default=None,
+    help="Use the stored export of this app instead of ./export.tar.gz",
+)
+@click.option(
+    "--environment",
+    "-e",
+    type=click.Choice(["production", "testing"]),
+    default="testing",
+    help="The environment the export of --app-id was made in",
+)
+def import_collection(app_id, environment):
     util.import_collection_to_lime_bi(
         app_id="d50c43e32a4447a0be647d3d2079115a",
         app_information={
@@ -143,12 +306,25 @@ def import_collection():
             "admin_password": METABASE_LIME_CLOUD_DEV_ADMIN_PASSWORD,
             "metabase_url": METABASE_LIME_CLOUD_DEV_METABASE_URL,
         },
+        tarball_path=get_tarball_path(app_id, environment),
     )
 
 
 @click.command()
-def remove_segments():
-    export_tarfile_path = "export.tar.gz"
+@click.option(
+    "--app-id",
+    default=None,
+    help="Use the stored export of this app instead of ./export.tar.gz",
+)
+@click.option(
+    "--environment",
+    "-e",
+    type=click.Choice(["production", "testing"]),
+    default="testing",
+    help="The environment the export of --app-id was made in",
+)
+def remove_segments(app_id, environment):
+    export_tarfile_path = get_tarball_path(app_id, environment)
 
     with tempfile.TemporaryDirectory():
         temp_dir_database = Path(tempfile.mkdtemp())
@@ -162,12 +338,13 @@ def remove_segments():
 @click.command()
 def test_replace_segments():
 
-    apps = util.load_application_data("testing")
+    registry = ApplicationRegistry.load("testing")
     source_app_id = "89cc050582504c248364ca7bf0365d00"
     source_database_id = 89
     destination_database_id = 22
 
-    source_app = apps[source_app_id]
+    source_app = registry.get_credentials(source_app_id)
+    registry.close()
 
     client_factory_old = util.MetabaseCloudClientFactory(
         source_app_id,
@@ -192,11 +369,17 @@ def test_replace_segments():
         destination_client_factory=client_factory_new,
         source_database_id=source_database_id,
         destination_database_id=destination_database_id,
+        export_tarfile_path=util.get_export_tarball_path(
+            source_app_id, "testing"
+        ),
     )
 
 
 cli.add_command(load_applications)
 cli.add_command(test_export)
+cli.add_command(sync_lime_bi_config)
+cli.add_command(analyze_exports)
+cli.add_command(list_apps)
 cli.add_command(import_collection)
 cli.add_command(remove_segments)
 cli.add_command(test_replace_segments)
@@ -0,0 +1,258 @@
+import dbm
+import json
+import threading
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Optional
+from urllib.parse import urlparse
+
+PENDING = "pending"
+MISSING = "Missing"
+CREDENTIAL_FIELDS = ("app_user_username", "app_user_password")
+
+
+class CredentialStore:
+    # One key per app, so a lookup reads a single app's credentials from
+    # disk. The database is opened once, opening dbm.dumb reads its index.
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.db = None
+
+    def _open(self):
+        if self.db is None:
+            self.db = dbm.open(self.path, "c")
+        return self.db
+
+    def get(self, app_id: str) -> Optional[dict]:
+        with self.lock:
+            value = self._open().get(app_id)
+        if value is None:
+            return None
+        return json.loads(value)
+
+    def set_many(self, credentials: dict):
+        with self.lock:
+            db = self._open()
+            for app_id, app_credentials in credentials.items():
+                db[app_id] = json.dumps(app_credentials)
+
+    def close(self):
+        with self.lock:
+            if self.db is not None:
+                self.db.close()
+                self.db = None
+
+
+def _database_key(database_id) -> Optional[str]:
+    # Ids from Consul may be strings while Metabase and the CLI use ints
+    if database_id is None:
+        return None
+    return str(database_id)
+
+
+@dataclass(slots=True)
+class AppRecord:
+    app_id: str
+    lime_bi_config: Optional[dict] = None
+    has_app_user: Optional[bool] = None
+    export_status: str = PENDING
+    export_duration: Optional[float] = None
+    export_size: Optional[int] = None
+    collection_item_count: Optional[int] = None
+    upload_status: Optional[str] = None
+    metabase_host: Optional[str] = None
+
+    @property
+    def database_id(self) -> Optional[int]:
+        return (self.lime_bi_config or {}).get("database_id")
+
+    @property
+    def collection_id(self) -> Optional[int]:
+        return (self.lime_bi_config or {}).get("collection_id")
+
+    @property
+    def group_id(self) -> Optional[int]:
+        return (self.lime_bi_config or {}).get("group_id")
+
+    @classmethod
+    def from_application(
+        cls, app_id: str, application: dict, host: Optional[str] = None
+    ):
+        lime_bi_config = application.get("lime_bi_config")
+        if not isinstance(lime_bi_config, dict) or not lime_bi_config:
+            lime_bi_config = None
+
+        has_app_user = application.get("has_app_user")
+        if "app_user_username" in application:
+            has_app_user = application["app_user_username"] != MISSING
+
+        metabase_url = (lime_bi_config or {}).get("metabase_url")
+        if metabase_url:
+            host = urlparse(metabase_url).netloc
+
+        return cls(
+            app_id=app_id,
+            lime_bi_config=lime_bi_config,
+            has_app_user=has_app_user,
+            export_status=application.get("export_status", PENDING),
+            export_duration=application.get("export_duration"),
+            export_size=application.get("export_size"),
+            collection_item_count=application.get("collection_item_count"),
+            upload_status=application.get("upload_status"),
+            metabase_host=host,
+        )
+
+    def to_application(self) -> dict:
+        application = {"lime_bi_config": self.lime_bi_config or MISSING}
+        if self.has_app_user is not None:
+            application["has_app_user"] = self.has_app_user
+        if self.export_status != PENDING:
+            application["export_status"] = self.export_status
+        for field in (
+            "export_duration",
+            "export_size",
+            "collection_item_count",
+            "upload_status",
+        ):
+            value = getattr(self, field)
+            if value is not None:
+                application[field] = value
+        return application
+
+
+class ApplicationRegistry:
+    def __init__(
+        self, environment: str = "testing", metabase_url: Optional[str] = None
+    ):
+        self.file_path = f"applications-{environment}.json"
+        self.credentials = CredentialStore(f"credentials-{environment}")
+        self.default_host = (
+            urlparse(metabase_url).netloc if metabase_url else None
+        )
+        self.records = {}
+        self.by_status = defaultdict(set)
+        self.by_database_id = defaultdict(set)
+        self.by_metabase_host = defaultdict(set)
+        self.missing_lime_bi_config = set()
+
+    @classmethod
+    def load(
+        cls, environment: str = "testing", metabase_url: Optional[str] = None
+    ):
+        registry = cls(environment, metabase_url)
+        try:
+            with open(registry.file_path, "r") as file:
+                applications = json.load(file)
+        except FileNotFoundError:
+            applications = {}
+
+        # Older files keep the app user credentials inline, move them out
+        credentials = {}
+        for app_id, application in applications.items():
+            registry.add(
+                AppRecord.from_application(
+                    app_id, application, registry.default_host
+                )
+            )
+            if any(field in application for field in CREDENTIAL_FIELDS):
+                credentials[app_id] = {
+                    field: application.get(field, MISSING)
+                    for field in CREDENTIAL_FIELDS
+                }
+        if credentials:
+            registry.credentials.set_many(credentials)
+            registry.save()
+
+        return registry
+
+    def save(self):
+        with open(self.file_path, "w") as file:
+            json.dump(
+                {
+                    app_id: record.to_application()
+                    for app_id, record in self.records.items()
+                },
+                file,
+            )
+
+    def _index(self, record: AppRecord):
+        self.by_status[record.export_status].add(record.app_id)
+        self.by_database_id[_database_key(record.database_id)].add(
+            record.app_id
+        )
+        self.by_metabase_host[record.metabase_host].add(record.app_id)
+        if record.lime_bi_config is None:
+            self.missing_lime_bi_config.add(record.app_id)
+
+    def _unindex(self, record: AppRecord):
+        self.by_status[record.export_status].discard(record.app_id)
+        self.by_database_id[_database_key(record.database_id)].discard(
+            record.app_id
+        )
+        self.by_metabase_host[record.metabase_host].discard(record.app_id)
+        self.missing_lime_bi_config.discard(record.app_id)
+
+    def add(self, record: AppRecord):
+        if record.app_id in self.records:
+            self.remove(record.app_id)
+        if record.metabase_host is None:
+            record.metabase_host = self.default_host
+        self.records[record.app_id] = record
+        self._index(record)
+
+    def remove(self, app_id: str):
+        self._unindex(self.records.pop(app_id))
+
+    def update(self, app_id: str, **changes):
+        record = self.records[app_id]
+        self._unindex(record)
+        for field, value in changes.items():
+            setattr(record, field, value)
+        self._index(record)
+
+    def get(self, app_id: str) -> AppRecord:
+        return self.records[app_id]
+
+    def query(
+        self,
+        status: Optional[str] = None,
+        database_id: Optional[int] = None,
+        metabase_host: Optional[str] = None,
+        missing_lime_bi_config: Optional[bool] = None,
+    ) -> list:
+        # Intersect the matching indexes, starting from the smallest one
+        candidates = []
+        if status is not None:
+            candidates.append(self.by_status.get(status, set()))
+        if database_id is not None:
+            candidates.append(
+                self.by_database_id.get(_database_key(database_id), set())
+            )
+        if metabase_host is not None:
+            candidates.append(self.by_metabase_host.get(metabase_host, set()))
+        if missing_lime_bi_config:
+            candidates.append(self.missing_lime_bi_config)
+
+        if candidates:
+            candidates.sort(key=len)
+            app_ids = set(candidates[0]).intersection(*candidates[1:])
+        else:
+            app_ids = set(self.records)
+        if missing_lime_bi_config is False:
+            app_ids -= self.missing_lime_bi_config
+
+        return [self.records[app_id] for app_id in sorted(app_ids)]
+
+    def get_credentials(self, app_id: str) -> dict:
+        credentials = self.credentials.get(app_id)
+        if credentials is None:
+            return {field: MISSING for field in CREDENTIAL_FIELDS}
+        return credentials
+
+    def close(self):
+        self.credentials.close()
+
+    def set_credentials(self, app_id: str, credentials: dict):
+        self.credentials.set_many({app_id: credentials})
+        self.update(app_id, has_app_user=True)
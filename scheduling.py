@@ -0,0 +1,64 @@
+import heapq
+
+# Fallbacks used before any export history has been recorded
+DEFAULT_EXPORT_SECONDS = 30.0
+DEFAULT_SECONDS_PER_ITEM = 0.5
+
+
+def _ratio(records: dict, numerator_key: str, denominator_key: str):
+    numerator = 0.0
+    denominator = 0.0
+    for record in records.values():
+        num = getattr(record, numerator_key)
+        den = getattr(record, denominator_key)
+        if num is None or not den:
+            continue
+        numerator += num
+        denominator += den
+    if not denominator:
+        return None
+    return numerator / denominator
+
+
+def estimate_export_size(record, bytes_per_item=None):
+    if record.export_size is not None:
+        return record.export_size
+    item_count = record.collection_item_count
+    if item_count is None or bytes_per_item is None:
+        return None
+    return item_count * bytes_per_item
+
+
+def estimate_export_durations(records: dict, app_ids: list) -> dict:
+    seconds_per_byte = _ratio(records, "export_duration", "export_size")
+    bytes_per_item = _ratio(records, "export_size", "collection_item_count")
+
+    estimates = {}
+    for app_id in app_ids:
+        record = records[app_id]
+        if record.export_duration is not None:
+            estimates[app_id] = record.export_duration
+            continue
+
+        size = estimate_export_size(record, bytes_per_item)
+        item_count = record.collection_item_count
+        if size is not None and seconds_per_byte is not None:
+            estimates[app_id] = size * seconds_per_byte
+        elif item_count is not None:
+            estimates[app_id] = item_count * DEFAULT_SECONDS_PER_ITEM
+        else:
+            estimates[app_id] = DEFAULT_EXPORT_SECONDS
+    return estimates
+
+
+def longest_first(estimates: dict) -> list:
+    return sorted(estimates, key=estimates.get, reverse=True)
+
+
+def predict_makespan(order: list, estimates: dict, workers: int = 1) -> float:
+    # Simulate workers picking the next job in order as soon as they are free
+    loads = [0.0] * max(1, min(workers, len(order)))
+    for app_id in order:
+        load = heapq.heappop(loads)
+        heapq.heappush(loads, load + estimates[app_id])
+    return max(loads) if order else 0.0
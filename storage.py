@@ -0,0 +1,113 @@
+import hashlib
+import json
+import logging
+import tarfile
+import threading
+
+import boto3
+from boto3.s3.transfer import TransferConfig
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+
+def file_sha256(file_path, chunk_size: int = MB) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def tarball_content_sha256(tarball_path) -> str:
+    # Tarballs from a fresh export differ in timestamps even when nothing
+    # changed, so only the names and contents of the members are hashed
+    if not tarfile.is_tarfile(tarball_path):
+        return file_sha256(tarball_path)
+
+    member_digests = {}
+    with tarfile.open(tarball_path, "r:*") as tar:
+        for member in tar:
+            if not member.isfile():
+                continue
+            member_digest = hashlib.sha256()
+            content = tar.extractfile(member)
+            for chunk in iter(lambda: content.read(MB), b""):
+                member_digest.update(chunk)
+            member_digests[member.name] = member_digest.hexdigest()
+
+    digest = hashlib.sha256()
+    for name in sorted(member_digests):
+        digest.update(f"{name}\0{member_digests[name]}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+class S3ExportSink:
+    def __init__(
+        self,
+        bucket: str,
+        prefix: str = "",
+        manifest_path: str = "s3-manifest.json",
+        endpoint_url: str = None,
+        part_size: int = 8 * MB,
+        max_concurrency: int = 4,
+        s3_client=None,
+    ):
+        self.bucket = bucket
+        self.prefix = prefix
+        self.manifest_path = manifest_path
+        self.s3_client = s3_client or boto3.client(
+            "s3", endpoint_url=endpoint_url
+        )
+        # Files larger than one part are streamed from disk as a multipart
+        # upload with the parts sent in parallel
+        self.transfer_config = TransferConfig(
+            multipart_threshold=part_size,
+            multipart_chunksize=part_size,
+            max_concurrency=max_concurrency,
+        )
+        self.lock = threading.Lock()
+        self.manifest = self.load_manifest()
+
+    def load_manifest(self):
+        try:
+            with open(self.manifest_path, "r") as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return {}
+
+    def save_manifest(self):
+        with open(self.manifest_path, "w") as file:
+            json.dump(self.manifest, file)
+
+    def manifest_key(self, key: str) -> str:
+        # The same manifest may be used with other buckets or endpoints
+        endpoint_url = self.s3_client.meta.endpoint_url
+        return f"{endpoint_url}/{self.bucket}/{key}"
+
+    def upload(self, tarball_path, name: str) -> bool:
+        key = f"{self.prefix}{name}"
+        manifest_key = self.manifest_key(key)
+        checksum = tarball_content_sha256(tarball_path)
+
+        with self.lock:
+            uploaded = self.manifest.get(manifest_key)
+        if uploaded and uploaded["sha256"] == checksum:
+            logger.info(f"Skipping unchanged s3://{self.bucket}/{key}")
+            return False
+
+        self.s3_client.upload_file(
+            str(tarball_path),
+            self.bucket,
+            key,
+            ExtraArgs={"Metadata": {"sha256": checksum}},
+            Config=self.transfer_config,
+        )
+        etag = self.s3_client.head_object(Bucket=self.bucket, Key=key)["ETag"]
+        logger.info(f"Uploaded s3://{self.bucket}/{key} with ETag {etag}")
+
+        with self.lock:
+            self.manifest[manifest_key] = {"etag": etag, "sha256": checksum}
+            self.save_manifest()
+        return True
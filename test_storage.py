@@ -0,0 +1,99 @@
+import io
+import tarfile
+import time
+
+import pytest
+
+boto3 = pytest.importorskip("boto3")
+moto = pytest.importorskip("moto")
+
+from storage import S3ExportSink  # noqa: E402
+
+BUCKET = "lime-bi-exports"
+
+
+def write_tarball(path, files: dict, mtime: float):
+    with tarfile.open(path, "w:gz") as tar:
+        for name, content in files.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            info.mtime = mtime
+            tar.addfile(info, io.BytesIO(content))
+
+
+@pytest.fixture
+def s3_client(monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    with moto.mock_aws():
+        client = boto3.client("s3")
+        client.create_bucket(Bucket=BUCKET)
+        yield client
+
+
+def create_sink(s3_client, tmp_path, bucket=BUCKET):
+    return S3ExportSink(
+        bucket,
+        prefix="testing/",
+        manifest_path=str(tmp_path / "s3-manifest.json"),
+        s3_client=s3_client,
+    )
+
+
+def test_rerun_skips_unchanged_export(s3_client, tmp_path):
+    tarball = tmp_path / "app.tar.gz"
+    files = {"lime_bi_collections/cards/deals.yaml": b"name: Deals\n"}
+
+    write_tarball(tarball, files, mtime=time.time() - 3600)
+    assert create_sink(s3_client, tmp_path).upload(tarball, "app.tar.gz")
+
+    # A new export of the same collection only differs in timestamps
+    write_tarball(tarball, files, mtime=time.time())
+    sink = create_sink(s3_client, tmp_path)
+    assert not sink.upload(tarball, "app.tar.gz")
+    assert sink.manifest_key("testing/app.tar.gz") in sink.manifest
+
+
+def test_other_bucket_gets_unchanged_export(s3_client, tmp_path):
+    tarball = tmp_path / "app.tar.gz"
+    write_tarball(tarball, {"cards/deals.yaml": b"name: Deals\n"}, 0)
+    assert create_sink(s3_client, tmp_path).upload(tarball, "app.tar.gz")
+
+    s3_client.create_bucket(Bucket="lime-bi-exports-copy")
+    sink = create_sink(s3_client, tmp_path, "lime-bi-exports-copy")
+    assert sink.upload(tarball, "app.tar.gz")
+    s3_client.head_object(
+        Bucket="lime-bi-exports-copy", Key="testing/app.tar.gz"
+    )
+
+
+def test_rerun_uploads_changed_export(s3_client, tmp_path):
+    tarball = tmp_path / "app.tar.gz"
+
+    write_tarball(tarball, {"cards/deals.yaml": b"name: Deals\n"}, 0)
+    assert create_sink(s3_client, tmp_path).upload(tarball, "app.tar.gz")
+
+    write_tarball(tarball, {"cards/deals.yaml": b"name: Won deals\n"}, 0)
+    assert create_sink(s3_client, tmp_path).upload(tarball, "app.tar.gz")
+
+    body = s3_client.get_object(Bucket=BUCKET, Key="testing/app.tar.gz")
+    with tarfile.open(fileobj=io.BytesIO(body["Body"].read())) as tar:
+        content = tar.extractfile("cards/deals.yaml").read()
+    assert content == b"name: Won deals\n"
+
+
+def test_large_export_is_uploaded_in_parts(s3_client, tmp_path):
+    tarball = tmp_path / "app.tar.gz"
+    tarball.write_bytes(bytes(12 * 1024 * 1024))
+
+    sink = S3ExportSink(
+        BUCKET,
+        manifest_path=str(tmp_path / "s3-manifest.json"),
+        part_size=5 * 1024 * 1024,
+        s3_client=s3_client,
+    )
+    assert sink.upload(tarball, "app.tar.gz")
+    # Multipart ETags end with the number of parts
+    etag = sink.manifest[sink.manifest_key("app.tar.gz")]["etag"]
+    assert etag.strip('"').endswith("-3")
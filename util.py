@@ -2,6 +2,9 @@ import json
 import logging
 import os
 import re
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
 import requests
@@ -15,8 +18,10 @@ from limepkg_metabase.serialization import (
     import_all_collections,
 )
 
+import scheduling
 from cloudadmin import CloudAdminClient
 from consul import ConsulClient
+from registry import PENDING, ApplicationRegistry, AppRecord
 
 logger = logging.getLogger(__name__)
 export_result = {"failed": [], "succeeded": []}
@@ -36,6 +41,7 @@ CLOUD_ADMIN_ENDPOINT = os.getenv("CLOUD_ADMIN_ENDPOINT")
 
 COLLECTION_FILE_NAME = "./export.tar.gz"
 PERSONAL_COLLECTION_FILE_NAME = "./personal_collections.tar.gz"
+EXPORT_DIRECTORY = "./exports"
 
 
 class MetabaseCloudClientFactory(MetabaseClientFactory):
@@ -77,24 +83,11 @@ class MetabaseCloudClientFactory(MetabaseClientFactory):
         )
 
 
-def load_application_data(environment: str = "testing"):
-    try:
-        with open(f"applications-{environment}.json", "r") as file:
-            applications = json.load(file)
-    except FileNotFoundError:
-        applications = {}
-        with open(f"applications-{environment}.json", "w") as file:
-            json.dump(applications, file)
-    return applications
-
-
-def save_application_data(applications, environment: str = "testing"):
-    with open(f"applications-{environment}.json", "w") as file:
-        json.dump(applications, file)
-
-
 def import_collection_to_lime_bi(
-    app_id: str, app_information: dict, lime_bi_credentials: dict
+    app_id: str,
+    app_information: dict,
+    lime_bi_credentials: dict,
+    tarball_path: str = COLLECTION_FILE_NAME,
 ):
     client_factory = MetabaseCloudClientFactory(
         app_id,
@@ -123,7 +116,7 @@ def import_collection_to_lime_bi(
             collection_id=app_information["lime_bi_config"]["collection_id"],
             group_id=app_information["lime_bi_config"]["group_id"],
             database_id=app_information["lime_bi_config"]["database_id"],
-            tarball_path=COLLECTION_FILE_NAME,
+            tarball_path=tarball_path,
             app_identifier=app_id,
         )
         print(widgets)
@@ -133,7 +126,10 @@ def import_collection_to_lime_bi(
 
 
 def export_collection_from_lime_bi(
-    app_id: str, app_information: dict, lime_bi_credentials: dict
+    app_id: str,
+    app_information: dict,
+    lime_bi_credentials: dict,
+    tarball_path: str = COLLECTION_FILE_NAME,
 ):
     client_factory = MetabaseCloudClientFactory(
         app_identifier=app_id,
@@ -164,18 +160,29 @@ def export_collection_from_lime_bi(
             database_id=app_information["lime_bi_config"]["database_id"],
         ) as tarball:
             source = Path(tarball)
-            dest = Path(COLLECTION_FILE_NAME)
-            dest.write_bytes(source.read_bytes())
+            dest = Path(tarball_path)
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(source, dest)
             return "succeeded"
     except ExportError as e:
         logger.exception(e)
         return "failed"
 
 
+def upload_export(sink, app_id: str, tarball_path: str):
+    try:
+        if sink.upload(tarball_path, f"{app_id}.tar.gz"):
+            return "uploaded"
+        return "unchanged"
+    except Exception as e:
+        logger.exception(e)
+        return "failed"
+
+
 def get_applications_from_cloud_admin(
     lambda_credentials: dict, environment: str = "testing"
 ):
-    apps = load_application_data(environment)
+    registry = ApplicationRegistry.load(environment)
 
     cloud_admin_client = CloudAdminClient(
         CLOUD_ADMIN_API_KEY, CLOUD_ADMIN_ENDPOINT
@@ -186,36 +193,45 @@ def get_applications_from_cloud_admin(
     for found_app in found_apps:
         identifier = found_app["identifier"]
 
-        if identifier not in apps:
-            apps[identifier] = {}
-
-        lime_bi_config = None
-
-        if "lime_bi_config" not in apps[identifier]:
+        if identifier not in registry.records:
             lime_bi_config = fetch_lime_bi_config(
                 identifier, environment, found_app
             )
+            if not isinstance(lime_bi_config, dict) or not lime_bi_config:
+                lime_bi_config = None
+            registry.add(AppRecord(identifier, lime_bi_config=lime_bi_config))
+
+        if registry.get(identifier).has_app_user is None:
+            app_user = fetch_app_user(lambda_credentials, identifier)
+            try:
+                registry.set_credentials(
+                    identifier,
+                    {
+                        "app_user_username": app_user["app_user_username"],
+                        "app_user_password": app_user["app_user_password"],
+                    },
+                )
+            except Exception:
+                registry.update(identifier, has_app_user=False)
+
+    registry.save()
+    registry.close()
+
+
+def sync_lime_bi_configs(environment: str = "testing", dry_run=False):
+    registry = ApplicationRegistry.load(environment)
+
+    desired = {
+        record.app_id: {"lime_bi_config": record.lime_bi_config}
+        for record in registry.query(missing_lime_bi_config=False)
+    }
 
-            if lime_bi_config:
-                apps[identifier]["lime_bi_config"] = lime_bi_config
-            else:
-                apps[identifier]["lime_bi_config"] = "Missing"
-
-        if "lime_bi_config" in apps[identifier]:
-            if "app_user_username" not in apps[identifier]:
-                app_user = fetch_app_user(lambda_credentials, identifier)
-                try:
-                    apps[identifier]["app_user_username"] = app_user[
-                        "app_user_username"
-                    ]
-                    apps[identifier]["app_user_password"] = app_user[
-                        "app_user_password"
-                    ]
-                except Exception:
-                    apps[identifier]["app_user_username"] = "Missing"
-                    apps[identifier]["app_user_password"] = "Missing"
-
-    save_application_data(apps, environment)
+    cloud_admin_client = CloudAdminClient(
+        CLOUD_ADMIN_API_KEY, CLOUD_ADMIN_ENDPOINT
+    )
+    return cloud_admin_client.sync_docker_swarm_objects(
+        desired, create_missing=False, dry_run=dry_run
+    )
 
 
 def fetch_lime_bi_config(identifier, environment, found_app):
@@ -237,30 +253,200 @@ def fetch_app_user(lambda_credentials, identifier):
     return json.loads(response.text)
 
 
+def get_export_tarball_path(app_id: str, environment: str = "testing"):
+    return f"{EXPORT_DIRECTORY}/{environment}/{app_id}.tar.gz"
+
+
+def create_metabase_session(lime_bi_credentials: dict):
+    session = requests.Session()
+    response = session.post(
+        f"{lime_bi_credentials['metabase_url']}/api/session",
+        json={
+            "username": lime_bi_credentials["admin_username"],
+            "password": lime_bi_credentials["admin_password"],
+        },
+    )
+    response.raise_for_status()
+    session.headers["X-Metabase-Session"] = response.json()["id"]
+    return session
+
+
+def get_collection_item_count(
+    session: requests.Session, metabase_url: str, collection_id
+):
+    url = f"{metabase_url}/api/collection/{collection_id}/items"
+    response = session.get(
+        url, params={"models": ["card", "dataset", "dashboard", "collection"]}
+    )
+    response.raise_for_status()
+    result = response.json()
+    # Newer Metabase versions wrap the items in a paginated response
+    items = result["data"] if isinstance(result, dict) else result
+
+    count = 0
+    for item in items:
+        if item.get("model") == "collection":
+            count += get_collection_item_count(
+                session, metabase_url, item["id"]
+            )
+        else:
+            count += 1
+    return count
+
+
+def fetch_collection_item_counts(
+    registry: ApplicationRegistry,
+    app_ids: list,
+    lime_bi_credentials: dict,
+    session=None,
+    workers: int = 1,
+):
+    if session is None:
+        logger.warning("No Metabase session, collection items not counted")
+        return
+
+    # Only apps without export history need an item count for the estimate
+    app_ids = [
+        app_id
+        for app_id in app_ids
+        if registry.get(app_id).export_duration is None
+        and registry.get(app_id).collection_item_count is None
+    ]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(
+                get_collection_item_count,
+                session,
+                lime_bi_credentials["metabase_url"],
+                registry.get(app_id).collection_id,
+            ): app_id
+            for app_id in app_ids
+        }
+        for future in as_completed(futures):
+            app_id = futures[future]
+            try:
+                item_count = future.result()
+            except Exception as e:
+                logger.warning(
+                    f"Could not count collection items for {app_id}: {e}"
+                )
+                continue
+            registry.update(app_id, collection_item_count=item_count)
+
+
+def export_app_with_timing(
+    app_id: str,
+    registry: ApplicationRegistry,
+    lime_bi_credentials: dict,
+    environment: str = "testing",
+    sink=None,
+):
+    tarball_path = get_export_tarball_path(app_id, environment)
+    start = time.monotonic()
+    try:
+        # Credentials are read from the store only when the app is exported
+        app_information = {
+            "lime_bi_config": registry.get(app_id).lime_bi_config,
+            **registry.get_credentials(app_id),
+        }
+        result = export_collection_from_lime_bi(
+            app_id, app_information, lime_bi_credentials, tarball_path
+        )
+    except Exception as e:
+        logger.exception(e)
+        result = "failed"
+    duration = time.monotonic() - start
+
+    size = None
+    upload_status = None
+    if result == "succeeded":
+        size = os.path.getsize(tarball_path)
+        # Uploading is not part of the export duration used for scheduling
+        if sink:
+            upload_status = upload_export(sink, app_id, tarball_path)
+    return result, duration, size, upload_status
+
+
 def test_export_for_apps(
-    lime_bi_credentials: dict, environment: str = "testing"
+    lime_bi_credentials: dict,
+    environment: str = "testing",
+    workers: int = 1,
+    sink=None,
+    retry_failed: bool = False,
 ):
-    apps = load_application_data(environment)
-
-    for app_id, application in apps.items():
-        if "export_status" not in application:
-            if (
-                apps[app_id]["lime_bi_config"] != "Missing"
-                and apps[app_id]["app_user_username"] != "Missing"
-            ):
-                print(app_id)
-                try:
-                    result = export_collection_from_lime_bi(
-                        app_id, application, lime_bi_credentials[environment]
-                    )
-                    apps[app_id]["export_status"] = result
-                except Exception as e:
-                    logger.exception(e)
-                    apps[app_id]["export_status"] = "failed"
-            else:
-                apps[app_id]["export_status"] = "failed"
-
-        save_application_data(apps, environment)
+    registry = ApplicationRegistry.load(
+        environment, lime_bi_credentials[environment]["metabase_url"]
+    )
+
+    if retry_failed:
+        for record in registry.query(
+            status="failed", missing_lime_bi_config=False
+        ):
+            if record.has_app_user:
+                registry.update(record.app_id, export_status=PENDING)
+
+    pending = []
+    for record in registry.query(status=PENDING):
+        if record.lime_bi_config is not None and record.has_app_user:
+            pending.append(record.app_id)
+        else:
+            registry.update(record.app_id, export_status="failed")
+
+    metabase_url = lime_bi_credentials[environment]["metabase_url"]
+    try:
+        session = create_metabase_session(lime_bi_credentials[environment])
+    except Exception as e:
+        logger.warning(f"Could not log in to {metabase_url}: {e}")
+        session = None
+
+    fetch_collection_item_counts(
+        registry,
+        pending,
+        lime_bi_credentials[environment],
+        session,
+        workers,
+    )
+    registry.save()
+
+    estimates = scheduling.estimate_export_durations(registry.records, pending)
+    order = scheduling.longest_first(estimates)
+    predicted = scheduling.predict_makespan(order, estimates, workers)
+    print(
+        f"Exporting {len(order)} apps with {workers} workers,"
+        f" predicted sweep duration: {predicted:.1f}s"
+    )
+
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # Jobs are picked up in submission order, longest expected first
+        futures = {
+            executor.submit(
+                export_app_with_timing,
+                app_id,
+                registry,
+                lime_bi_credentials[environment],
+                environment,
+                sink,
+            ): app_id
+            for app_id in order
+        }
+        for future in as_completed(futures):
+            app_id = futures[future]
+            result, duration, size, upload_status = future.result()
+            print(f"{app_id}: {result} in {duration:.1f}s")
+            changes = {"export_status": result}
+            if result == "succeeded":
+                changes["export_duration"] = duration
+                changes["export_size"] = size
+            if upload_status:
+                print(f"{app_id}: upload {upload_status}")
+                changes["upload_status"] = upload_status
+            registry.update(app_id, **changes)
+            registry.save()
+    actual = time.monotonic() - start
+    registry.close()
+
+    print(f"Sweep duration: predicted {predicted:.1f}s, actual {actual:.1f}s")
 
 
 def get_lime_bi_config(
@@ -313,7 +499,7 @@ def replace_segments(
     destination_client_factory: MetabaseClientFactory,
     source_database_id,
     destination_database_id,
-    export_tarfile_path="export.tar.gz",
+    export_tarfile_path=COLLECTION_FILE_NAME,
 ):
 
     database_segment_mapper = SegmentMapper(